@@ -1,5 +1,6 @@
 # ---------- Config ----------
 ASSETS = ["OIL", "GOLD", "ELECTRONICS", "RICE", "PLUMBER"]
+ASSET_INDEX = {a: i for i, a in enumerate(ASSETS)}  # symbol -> slot in price arrays
 DEFAULT_TICK_SECONDS = 2
 PRICE_TICK = 0.01
 DEFAULT_STARTING_CASH = 10_000.0
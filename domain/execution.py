@@ -1,9 +1,11 @@
 # domain/execution.py
 from __future__ import annotations
 
+import math
 import time
 from typing import Optional, Tuple
 
+from config import ASSET_INDEX
 from domain.models import LobbyState, PlayerState
 from domain.portfolio import record_trade
 
@@ -26,7 +28,7 @@ def execute_market(lobby: LobbyState, pl: PlayerState, asset: str, side: str,
     ----------
     lobby : LobbyState
         The lobby containing the current market price for the asset.
-        Uses `lobby.prices[asset]` as the execution price.
+        Uses `lobby.prices_arr[ASSET_INDEX[asset]]` as the execution price.
 
     pl : PlayerState
         The player whose positions and cash should be updated by this execution.
@@ -82,13 +84,20 @@ def execute_market(lobby: LobbyState, pl: PlayerState, asset: str, side: str,
       and entry timestamp are reset.
     - Realized PnL is added to `pl.realized_pnl`.
     - Cash is updated correctly for both buy and sell executions.
+    - The position is read from and written back to the player's position
+      arrays (`qty_arr`, `avg_arr`, `entry_ts_arr`) at index `ASSET_INDEX[asset]`.
+    - Whenever the position is written back (on success, and on a reject
+      after a partial cover/close) the cash is written with it, the player is
+      flagged `dirty` and the lobby `leaderboard_dirty`, so the ticker sends
+      a full portfolio snapshot and the leaderboard on the next tick.
 
     Notes
     -----
     - This is a simplified trading model with a single market price and no slippage
       or order book. All orders execute at the current mid-price.
-    - Execution is atomic: if any part of the order violates constraints (e.g.
-      insufficient cash), the function returns an error before modifying state.
+    - Execution is not atomic: if the remainder of an order violates constraints
+      (e.g. insufficient cash), the cover/close that already ran is kept (trade,
+      realized PnL, position and cash) and the error is returned for the rest.
     - The function does not handle margin, leverage, commissions, or liquidation.
 
     Examples
@@ -99,65 +108,72 @@ def execute_market(lobby: LobbyState, pl: PlayerState, asset: str, side: str,
     - SELL with an existing long:
         First closes part/all of the long, then opens a short if qty remains.
     """
-    price = lobby.prices[asset]
-    pos = pl.positions[asset]
+    i = ASSET_INDEX[asset]
+    price = lobby.prices_arr.item(i)
+    # Work on Python scalars of the position (`.item` avoids boxing NumPy
+    # scalars); written back together with the cash by `_store_position`.
+    pos_qty = pl.qty_arr.item(i)
+    pos_avg = pl.avg_arr.item(i)
+    entry_ts = pl.entry_ts_arr.item(i)
+    pos_ts = None if math.isnan(entry_ts) else entry_ts  # NaN = no open position
     cash = pl.cash
 
     if side == "BUY":
         # cover short first
-        if pos["qty"] < 0:
-            cover = min(qty, -pos["qty"])
+        if pos_qty < 0:
+            cover = min(qty, -pos_qty)
             if cover > 0:
                 record_trade(
                     pl,
                     asset=asset,
                     side_open="SHORT",
                     qty=cover,
-                    entry_price=pos["avg"],
+                    entry_price=pos_avg,
                     exit_price=price,
-                    entry_ts=pos["entry_ts"],
+                    entry_ts=pos_ts,
                 )
                 cash -= price * cover
-                pos["qty"] += cover
-                if pos["qty"] == 0:
-                    pos["avg"] = 0.0
-                    pos["entry_ts"] = None
+                pos_qty += cover
+                if pos_qty == 0:
+                    pos_avg = 0.0
+                    pos_ts = None
                 qty -= cover
 
         # extend/create long
         if qty > 0:
             cost = price * qty
             if cash < cost:
+                _store_position(lobby, pl, i, cash, pos_qty, pos_avg, pos_ts)  # a cover may already have run
                 return False, "insufficient_cash"
-            if pos["qty"] > 0:
-                pos["avg"] = (pos["avg"] * pos["qty"] +
-                              price * qty) / (pos["qty"] + qty)
+            if pos_qty > 0:
+                pos_avg = (pos_avg * pos_qty +
+                           price * qty) / (pos_qty + qty)
             else:
-                pos["avg"] = price
-            pos["qty"] += qty
+                pos_avg = price
+            pos_qty += qty
             cash -= cost
-            if pos["entry_ts"] is None:
-                pos["entry_ts"] = time.time()
+            if pos_ts is None:
+                pos_ts = time.time()
 
     else:  # SELL
         # close long first
-        if pos["qty"] > 0:
-            close_qty = min(qty, pos["qty"])
+        if pos_qty > 0:
+            close_qty = min(qty, pos_qty)
             if close_qty > 0:
                 record_trade(
                     pl,
                     asset=asset,
                     side_open="LONG",
                     qty=close_qty,
-                    entry_price=pos["avg"],
+                    entry_price=pos_avg,
                     exit_price=price,
-                    entry_ts=pos["entry_ts"],
+                    entry_ts=pos_ts,
                 )
                 cash += price * close_qty
-                pos["qty"] -= close_qty
-                if pos["qty"] == 0:
-                    pos["avg"] = 0.0
-                    pos["entry_ts"] = None
+                pos_qty -= close_qty
+                if pos_qty == 0:
+                    pos_avg = 0.0
+                    pos_ts = None
                 qty -= close_qty
 
         # open/extend short
@@ -166,18 +182,33 @@ def execute_market(lobby: LobbyState, pl: PlayerState, asset: str, side: str,
 
             # SIMPLE SHORT RULE: require cash collateral BEFORE receiving short proceeds
             if cash < notional:
+                _store_position(lobby, pl, i, cash, pos_qty, pos_avg, pos_ts)  # a close may already have run
                 return False, "insufficient_cash_to_short"
 
-            new_qty = pos["qty"] - qty
-            if pos["qty"] < 0:
-                pos["avg"] = (pos["avg"] * abs(pos["qty"]) +
-                              price * qty) / (abs(pos["qty"]) + qty)
+            new_qty = pos_qty - qty
+            if pos_qty < 0:
+                pos_avg = (pos_avg * abs(pos_qty) +
+                           price * qty) / (abs(pos_qty) + qty)
             else:
-                pos["avg"] = price
-            pos["qty"] = new_qty
+                pos_avg = price
+            pos_qty = new_qty
             cash += notional
-            if pos["entry_ts"] is None:
-                pos["entry_ts"] = time.time()
+            if pos_ts is None:
+                pos_ts = time.time()
 
-    pl.cash = cash
+    _store_position(lobby, pl, i, cash, pos_qty, pos_avg, pos_ts)
     return True, None
+
+
+def _store_position(lobby: LobbyState, pl: PlayerState, i: int, cash: float,
+                    qty: int, avg: float, entry_ts: Optional[float]) -> None:
+    # Write the cash and one asset's position back into the player and flag
+    # the portfolio and leaderboard for a full resend: this also runs on
+    # rejects, after a partial cover/close may already have recorded a trade
+    # and moved cash.
+    pl.dirty = True
+    lobby.leaderboard_dirty = True
+    pl.cash = cash
+    pl.qty_arr[i] = qty
+    pl.avg_arr[i] = avg
+    pl.entry_ts_arr[i] = math.nan if entry_ts is None else entry_ts
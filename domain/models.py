@@ -2,8 +2,14 @@
 from __future__ import annotations
 
 import asyncio
-import random
-from typing import Dict, Optional
+from typing import Dict, Optional, Tuple, TYPE_CHECKING
+
+import numpy as np
+
+from domain.pricing import init_market_states
+
+if TYPE_CHECKING:
+    from fastapi import WebSocket
 
 # central game constants live in config.py
 from config import (
@@ -57,23 +63,18 @@ class PlayerState:
         Current available cash in the player’s account.
         This is reduced when opening positions and increased when positions close.
 
-    positions : Dict[str, Dict]
-        A dictionary mapping each tradable asset symbol to its position state.
-        The structure is:
-        
-        positions[asset] = {
-            "qty": int,
-                Current net quantity (positive = long, negative = short).
-            
-            "avg": float,
-                Volume-weighted average entry price for the open position.
-                If qty = 0, avg = 0.0 by convention.
-            
-            "entry_ts": Optional[float]
-                Timestamp of when the position was first opened.
-                Useful for later analytics or enforcing holding time rules.
-        }
-        
+    qty_arr : numpy.ndarray
+        int64 array of the net quantity per asset, in `ASSETS` order
+        (index with `config.ASSET_INDEX`). Mark-to-market valuation is a
+        single dot product with the lobby's `prices_arr`.
+
+    avg_arr : numpy.ndarray
+        float64 array of the average entry price per asset (0.0 when flat).
+
+    entry_ts_arr : numpy.ndarray
+        float64 array of the timestamp each position was opened, NaN when
+        there is no open position.
+
         All assets start with zero quantity, zero average price, and no timestamp.
 
     realized_pnl : float
@@ -92,6 +93,16 @@ class PlayerState:
         
         This structure is useful for UI display, analytics, or post-game summaries.
 
+    dirty : bool
+        Whether the player's portfolio changed (order executed, new connection)
+        since the last full PORTFOLIO snapshot was pushed by the ticker.
+        Starts True so the first tick always sends a full snapshot.
+
+    ws : Optional[WebSocket]
+        The player's live WebSocket, or None while disconnected. Set by the
+        WebSocket endpoint on join/reconnect and read directly by lobby
+        broadcasts; it is the only userId -> socket link.
+
     Notes
     -----
     This class stores **only** the player's state — it does not perform execution
@@ -99,18 +110,39 @@ class PlayerState:
     `domain.execution` and written back into the `PlayerState` instance.
 
     This keeps the architecture clean: PlayerState = storage, Execution = logic.
+
+    Instances use `__slots__` and can be recycled through `reset()`; see the
+    player pool in `state.py`.
     """
+    __slots__ = ("user_id", "name", "ready", "cash", "qty_arr", "avg_arr",
+                 "entry_ts_arr", "realized_pnl", "trades", "dirty", "ws")
+
     def __init__(self, user_id: str, name: str, starting_cash: float):
+        n = len(ASSETS)
+        self.qty_arr = np.zeros(n, dtype=np.int64)
+        self.avg_arr = np.zeros(n, dtype=np.float64)
+        self.entry_ts_arr = np.full(n, np.nan)
+        self.trades: list = []  # closed trades
+        self.reset(user_id, name, starting_cash)
+
+    def reset(self, user_id: str, name: str, starting_cash: float) -> None:
+        """
+        Reinitialize this object as a fresh account for `user_id`.
+
+        Existing containers (position arrays, trade list) are cleared in place
+        rather than reallocated, so a pooled instance can be reused.
+        """
         self.user_id = user_id
         self.name = name
         self.ready = False
         self.cash = float(starting_cash)
-        # positions[a] = {"qty": int, "avg": float, "entry_ts": Optional[float]}
-        self.positions: Dict[str, Dict] = {
-            a: {"qty": 0, "avg": 0.0, "entry_ts": None} for a in ASSETS
-        }
+        self.qty_arr.fill(0)
+        self.avg_arr.fill(0.0)
+        self.entry_ts_arr.fill(np.nan)
         self.realized_pnl: float = 0.0
-        self.trades: list = []  # closed trades
+        self.trades.clear()
+        self.dirty = True  # portfolio changed since last full snapshot
+        self.ws: Optional[WebSocket] = None
 
 
 class LobbyState:
@@ -148,6 +180,8 @@ class LobbyState:
         - "startingCapital": initial cash allocated to each player
         - "tickSeconds": number of seconds between price updates
         - "durationSec": total duration of the match in seconds
+        - "sharedMarket": opt in to the shared market of all lobbies with the
+          same tickSeconds (see `SharedMarket`); defaults to False
 
     Attributes
     ----------
@@ -171,30 +205,53 @@ class LobbyState:
         {
             "startingCapital": float,
             "tickSeconds": int,
-            "durationSec": int
+            "durationSec": int,
+            "sharedMarket": bool
         }
 
         These rules are used when creating PlayerState objects and scheduling
         the real-time price ticker.
 
     seed : int
-        Random seed used to create the RNG for deterministic market simulation.
+        32-bit random seed (from `numpy.random.SeedSequence` OS entropy) used
+        to create the RNG for deterministic market simulation.
         Using a fixed seed allows the same lobby to replay identical price paths
         for debugging or replays.
 
-    rng : random.Random
-        A dedicated random number generator instance for this lobby. Ensures
-        that price updates are independent across different lobbies.
+    rng_np : numpy.random.Generator
+        A dedicated NumPy generator (seeded from `seed`) for this lobby. It is
+        the single source of randomness of the price engine and ensures that
+        price updates are independent across different lobbies.
+
+    noise_buf : numpy.ndarray
+        Preallocated float64 array (one slot per asset) that the price engine
+        draws each tick's Gaussian noise into.
+
+    prices_arr : numpy.ndarray
+        Contiguous float64 array of the current (tick-rounded) simulated price
+        of each asset, indexed by `ASSET_INDEX` / in `ASSETS` order.
+        Initialized at 100.0 for each asset. Updated in place by the ticker.
 
-    prices : Dict[str, float]
-        A dictionary mapping each asset symbol to its current simulated price.
-        Initialized at 100.0 for each asset. Updated continuously by the ticker.
+    market_states : domain.pricing.MarketState
+        Regime-switching state of every asset (struct of arrays), created
+        eagerly here so the price engine never has to check for it.
 
     players : Dict[str, PlayerState]
         Mapping from user_id → PlayerState object.
         Represents every player currently inside the lobby.
         PlayerState instances track cash, positions, trades, and PnL.
 
+    state_version : int
+        Counter bumped (via `bump_state()`) whenever anything shown in the
+        LOBBY_STATE payload changes: players joining/leaving, names, ready
+        flags or status. Used to reuse the serialized LOBBY_STATE frame
+        between changes.
+
+    leaderboard_dirty : bool
+        Set when an order executes or the roster changes. The ticker sends the
+        leaderboard at most once per tick, and only when this flag is set or
+        some player holds a position (prices then move equity).
+
     start_ts : Optional[float]
         UNIX timestamp marking when the trading session officially begins.
         Set when the host starts the game.
@@ -203,6 +260,14 @@ class LobbyState:
         UNIX timestamp marking when the session is scheduled to end.
         Calculated from start_ts + durationSec.
 
+    shared_market : Optional[SharedMarket]
+        The shared market this lobby trades on while running with
+        `rules["sharedMarket"]`, else None. While attached, `prices_arr`,
+        `market_states`, `rng_np`, `noise_buf` and `seed` are the market's
+        (shared by reference), so the lobby's own seed no longer replays its
+        price paths. Such a lobby builds no engine state of its own: those
+        attributes (and `seed`) are None until it is attached at game start.
+
     ticker_task : Optional[asyncio.Task]
         A background asyncio Task responsible for broadcasting price updates
         at fixed intervals (tickSeconds). This task is created by the WebSocket
@@ -217,7 +282,7 @@ class LobbyState:
       WebSocket handler reads/modifies this object and handles communication.
     
     - All real-time price generation happens outside LobbyState, typically inside
-      a ticker loop that updates `self.prices` and writes results to each
+      a ticker loop that updates `self.prices_arr` and writes results to each
       player's WebSocket connection.
 
     - Because multiple players share a single lobby, LobbyState is the canonical
@@ -236,15 +301,92 @@ class LobbyState:
             "startingCapital": float(rules.get("startingCapital", DEFAULT_STARTING_CASH)),
             "tickSeconds": int(rules.get("tickSeconds", DEFAULT_TICK_SECONDS)),
             "durationSec": int(rules.get("durationSec", DEFAULT_DURATION_SEC)),
+            "sharedMarket": bool(rules.get("sharedMarket", False)),
         }
         # market
-        self.seed = random.randint(1, 10_000)
-        self.rng = random.Random(self.seed)
-        self.prices = {a: 100.0 for a in ASSETS}
+        self.shared_market: Optional[SharedMarket] = None
+        if self.rules["sharedMarket"]:
+            # engine state comes from the shared market on game start
+            # (`attach_market`); nothing lobby-local is built
+            self.seed = None
+            self.rng_np = self.noise_buf = self.prices_arr = self.market_states = None
+        else:
+            # 32-bit seed drawn from OS entropy (no global `random` state); the
+            # generator is derived from it so the seed still replays the market.
+            self.seed = int(np.random.SeedSequence().entropy & 0xFFFFFFFF)
+            self.rng_np = np.random.default_rng(self.seed)
+            self.noise_buf = np.empty(len(ASSETS), dtype=np.float64)
+            self.prices_arr = np.full(len(ASSETS), 100.0, dtype=np.float64)
+            self.market_states = init_market_states(self.rng_np, self.prices_arr)
         # players
         self.players: Dict[str, PlayerState] = {}  # userId -> PlayerState
+        self.leaderboard_dirty = True  # rebroadcast leaderboard on next tick
+        # LOBBY_STATE frame cache: (state_version, serialized JSON)
+        self.state_version = 0
+        self._state_cache: Optional[Tuple[int, str]] = None
         # timing
         self.start_ts: Optional[float] = None
         self.end_ts: Optional[float] = None
         # async ticker task (created by WS handler)
         self.ticker_task: Optional[asyncio.Task] = None
+
+    def bump_state(self) -> None:
+        """Mark the LOBBY_STATE payload as changed (invalidates its cached frame)."""
+        self.state_version += 1
+
+    def attach_market(self, market: SharedMarket) -> None:
+        """Trade on `market`: share its price engine state by reference."""
+        self.shared_market = market
+        self.seed = market.seed
+        self.rng_np = market.rng_np
+        self.noise_buf = market.noise_buf
+        self.prices_arr = market.prices_arr
+        self.market_states = market.market_states
+        self.bump_state()  # seed changed
+
+
+class SharedMarket:
+    """
+    A single price simulation shared by every opted-in lobby with the same tick.
+
+    Lobbies created with `rules["sharedMarket"]` do not step their own market:
+    they attach to the `SharedMarket` of their `tickSeconds` (see
+    `state.acquire_shared_market`) and only do the per-lobby work (portfolio
+    snapshots, leaderboard) when the market pulses. One RNG, one `MarketState`
+    and one ticker then serve any number of lobbies.
+
+    Parameters
+    ----------
+    tick_seconds : int
+        Seconds between market steps; also the registry key.
+
+    Attributes
+    ----------
+    seed, rng_np, noise_buf, prices_arr, market_states
+        Same meaning as on `LobbyState`; attached lobbies reference these
+        objects directly.
+
+    pulse : asyncio.Event
+        Set (and immediately cleared) after every market step, waking the
+        attached lobby tickers.
+
+    refcount : int
+        Number of running lobbies attached to this market.
+
+    task : Optional[asyncio.Task]
+        The market's ticker task, started by the first attached lobby and
+        cancelled when the last one detaches.
+    """
+    __slots__ = ("tick_seconds", "seed", "rng_np", "noise_buf", "prices_arr",
+                 "market_states", "pulse", "refcount", "task")
+
+    def __init__(self, tick_seconds: int):
+        self.tick_seconds = tick_seconds
+        self.seed = int(np.random.SeedSequence().entropy & 0xFFFFFFFF)
+        self.rng_np = np.random.default_rng(self.seed)
+        self.noise_buf = np.empty(len(ASSETS), dtype=np.float64)
+        self.prices_arr = np.full(len(ASSETS), 100.0, dtype=np.float64)
+        self.market_states = init_market_states(self.rng_np, self.prices_arr)
+        self.pulse = asyncio.Event()
+        self.refcount = 0
+        self.task: Optional[asyncio.Task] = None
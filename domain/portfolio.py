@@ -4,6 +4,8 @@ from __future__ import annotations
 import time
 from typing import Optional, TYPE_CHECKING
 
+import numpy as np
+
 from config import ASSETS, MAX_TRADE_HISTORY
 
 if TYPE_CHECKING:
@@ -245,10 +247,8 @@ def snapshot_portfolio(lobby: LobbyState, pl: PlayerState) -> dict:
   upnl_total = 0.0
   mkt_value_total = 0.0
   rows = []
-  for a in ASSETS:
-    pos = pl.positions[a]
-    qty, avg = pos["qty"], pos["avg"]
-    price = lobby.prices[a]
+  for a, price, qty, avg in zip(ASSETS, lobby.prices_arr.tolist(),
+                                pl.qty_arr.tolist(), pl.avg_arr.tolist()):
     upnl = pos_unrealized_upnl(qty, avg, price)
     mkt_value = qty * price
     upnl_total += upnl
@@ -273,6 +273,24 @@ def snapshot_portfolio(lobby: LobbyState, pl: PlayerState) -> dict:
   }
 
 
+def is_flat(pl: PlayerState) -> bool:
+  """
+  Return True if the player has no open position in any asset.
+  """
+  return not pl.qty_arr.any()
+
+
+def snapshot_mark(pl: PlayerState) -> dict:
+  """
+  Compact per-tick update for a flat player whose portfolio did not change.
+
+  With no open positions, price moves cannot change the player's equity,
+  uPnL or trade history, so only the cash balance is sent (equity == cash).
+  The ticker sends this instead of a full `snapshot_portfolio` in that case.
+  """
+  return {"type": "MARK", "cash": round(pl.cash, 2)}
+
+
 def leaderboard(lobby: LobbyState):
   """
     Build and return the leaderboard for all players in a lobby.
@@ -287,13 +305,14 @@ def leaderboard(lobby: LobbyState):
     lobby : LobbyState
         The current lobby state, which contains:
         - all active players (`lobby.players`)
-        - current market prices for every tradable asset (`lobby.prices`)
+        - current market prices for every tradable asset (`lobby.prices_arr`)
 
     Computation Details
     -------------------
     For each player:
         - Market value (mark-to-market) is computed as:
               mv = sum( qty(asset) * price(asset) )
+          i.e. one dot product of `pl.qty_arr` with `lobby.prices_arr`.
         - Equity is then:
               equity = cash + mv
         - Realized PnL is taken from the PlayerState.
@@ -328,11 +347,10 @@ def leaderboard(lobby: LobbyState):
       UI in real time.
   """
   rows = []
+  prices = lobby.prices_arr
   for uid, pl in lobby.players.items():
     # compute equity (mark-to-market)
-    mv = 0.0
-    for a in ASSETS:
-      mv += pl.positions[a]["qty"] * lobby.prices[a]
+    mv = float(np.vdot(pl.qty_arr, prices))
     rows.append({
         "userId": uid,
         "name": pl.name,
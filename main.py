@@ -2,11 +2,12 @@
 # This file creates the FastAPI application, loads routes, serves the UI,
 # and registers the WebSocket endpoint for the trading game.
 
+import os
 from pathlib import Path
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import Response
 from fastapi.staticfiles import StaticFiles
 
 # REST routes for your normal HTTP API
@@ -37,20 +38,29 @@ app.add_middleware(
 # ---------------------------------------------------------
 # SERVE THE FRONTEND UI (index.html)
 # ---------------------------------------------------------
+# index.html (inside the "ui" folder next to this file) is read once at
+# startup and served from memory. Set UI_RELOAD=1 during UI development to
+# re-read it on every request instead.
+INDEX_FILE = UI_DIR / "index.html"
+UI_RELOAD = os.environ.get("UI_RELOAD") == "1"
+_INDEX_BYTES = INDEX_FILE.read_bytes()
+
+# "no cache" headers so the browser always reloads the page fresh
+_INDEX_HEADERS = {
+    "Cache-Control": "no-cache, no-store, must-revalidate",
+    "Pragma": "no-cache",
+    "Expires": "0",
+}
+
+# A Response is immutable once built, so one instance serves every request.
+_INDEX_RESPONSE = Response(_INDEX_BYTES, media_type="text/html", headers=_INDEX_HEADERS)
+
 @app.get("/")
 async def serve_ui():
-    # Locate index.html inside the "ui" folder (next to this file)
-    file_path = UI_DIR / "index.html"
-
-    # Return the file with "no cache" headers so  browser always reloads it fresh
-    return FileResponse(
-        file_path,
-        headers={
-            "Cache-Control": "no-cache, no-store, must-revalidate",
-            "Pragma": "no-cache",
-            "Expires": "0",
-        },
-    )
+    if UI_RELOAD:
+        return Response(INDEX_FILE.read_bytes(), media_type="text/html",
+                        headers=_INDEX_HEADERS)
+    return _INDEX_RESPONSE
 
 # ---------------------------------------------------------
 # STATIC FILES: CSS & JS
@@ -87,12 +97,33 @@ app.websocket("/ws")(ws_endpoint)
 # ---------------------------------------------------------
 # HEALTHCHECK
 # ---------------------------------------------------------
-# Simple endpoint to verify the server is running
+# Simple endpoint to verify the server is running. The response is prebuilt:
+# no JSON encoding or response validation per liveness probe.
+_HEALTH_RESPONSE = Response(b'{"status":"ok"}', media_type="application/json")
+
 @app.get("/health")
 async def health():
-    return {"status": "ok"}
+    return _HEALTH_RESPONSE
 
 if __name__ == "__main__":
     import uvicorn
 
-    uvicorn.run("main:app", host="0.0.0.0", port=5001, reload=True, ws="wsproto")
+    # Prefer uvloop (libuv-based event loop, much cheaper WebSocket fan-out);
+    # it is not available on Windows, so fall back to the stock asyncio loop.
+    try:
+        import uvloop  # noqa: F401
+        loop = "uvloop"
+    except ImportError:
+        loop = "asyncio"
+
+    # httptools (C HTTP parser) for the HTTP/upgrade side, h11 if missing.
+    try:
+        import httptools  # noqa: F401
+        http = "httptools"
+    except ImportError:
+        http = "h11"
+
+    # ws stays on wsproto: our local "websockets" package shadows the
+    # third-party library uvicorn would otherwise import.
+    uvicorn.run("main:app", host="0.0.0.0", port=5001, reload=True, ws="wsproto",
+                loop=loop, http=http)
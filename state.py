@@ -1,18 +1,25 @@
 from __future__ import annotations
 
+import asyncio
 import random
 import string
-from typing import Dict, Set, TYPE_CHECKING
+from typing import Dict, List, Set, TYPE_CHECKING
 from fastapi import WebSocket
 
-# Only for type hints to avoid circular imports at runtime
+# Instantiated here by the player pool and the shared market registry
+from domain.models import PlayerState, SharedMarket
+
+# LobbyState is only needed for type hints
 if TYPE_CHECKING:
-    from domain.models import LobbyState  # or wherever LobbyState lives
+    from domain.models import LobbyState
 
 # ---- Connections / sessions ----
 clients: Set[WebSocket] = set()                    # all connected sockets
 user_by_ws: Dict[WebSocket, str] = {}              # ws -> userId
-ws_by_user: Dict[str, WebSocket] = {}              # userId -> ws
+outbox_by_ws: Dict[WebSocket, asyncio.Queue] = {}  # ws -> outbound frame queue
+
+# Max frames waiting in a client's outbox; beyond this the oldest is dropped.
+OUTBOX_MAXSIZE = 64
 
 # ---- Lobbies ----
 lobbies: Dict[str, "LobbyState"] = {}              # lobbyId -> LobbyState
@@ -27,3 +34,49 @@ def gen_lobby_id() -> str:
     """Generate a 6-char lobby code, e.g. 'AB3Z9Q'."""
     alphabet = string.ascii_uppercase + "23456789"  # avoid 0/1 for readability
     return "".join(random.choices(alphabet, k=6))
+
+# ---- PlayerState pool ----
+# Players leaving a lobby are recycled instead of being dropped for the GC,
+# so rapid leave/join churn reuses their positions/arrays/trade lists.
+MAX_POOLED_PLAYERS = 256
+_player_pool: List[PlayerState] = []
+
+def acquire_player(user_id: str, name: str, starting_cash: float) -> PlayerState:
+    """Return a fresh PlayerState, reusing a pooled instance when available."""
+    if _player_pool:
+        pl = _player_pool.pop()
+        pl.reset(user_id, name, starting_cash)
+        return pl
+    return PlayerState(user_id, name, starting_cash)
+
+def release_player(pl: PlayerState) -> None:
+    """Hand a PlayerState that is no longer referenced back to the pool."""
+    # Drop what would otherwise stay alive while pooled: the (closed) socket,
+    # the name and the trade history.
+    pl.ws = None
+    pl.name = ""
+    pl.trades.clear()
+    if len(_player_pool) < MAX_POOLED_PLAYERS:
+        _player_pool.append(pl)
+
+# ---- Shared markets ----
+# Opt-in lobbies (rules["sharedMarket"]) with the same tickSeconds trade on one
+# market; it lives as long as at least one such lobby is running.
+shared_markets: Dict[int, SharedMarket] = {}       # tickSeconds -> SharedMarket
+
+def acquire_shared_market(tick_seconds: int) -> SharedMarket:
+    """Return the shared market for `tick_seconds`, creating it if needed."""
+    market = shared_markets.get(tick_seconds)
+    if market is None:
+        market = shared_markets[tick_seconds] = SharedMarket(tick_seconds)
+    market.refcount += 1
+    return market
+
+def release_shared_market(market: SharedMarket) -> None:
+    """Detach one lobby; the last one stops the market's ticker and drops it."""
+    market.refcount -= 1
+    if market.refcount <= 0:
+        if market.task:
+            market.task.cancel()
+        if shared_markets.get(market.tick_seconds) is market:
+            del shared_markets[market.tick_seconds]
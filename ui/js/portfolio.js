@@ -23,6 +23,41 @@ function formatPnL(value) {
   return (value >= 0 ? '+' : '') + value.toFixed(2);
 }
 
+/**
+ * Lightweight per-tick update sent while the player holds no positions:
+ * only cash is known to matter, and equity equals cash.
+ *
+ * @param {Object} m
+ * @param {number} m.cash
+ */
+export function renderMark(m) {
+  if (!m) return;
+
+  const cash = m.cash.toFixed(2);
+  for (const id of ["k_cash", "k_equity", "k_cash_top", "k_equity_top"]) {
+    const el = byId(id);
+    if (el) el.textContent = cash;
+  }
+}
+
+/**
+ * Refresh the LAST column of the positions table from a TICK.
+ * Flat players only get MARK updates, so without this their rows would keep
+ * the price of the last full PORTFOLIO snapshot.
+ *
+ * @param {Object<string, number>} prices - asset -> price
+ */
+export function updatePositionPrices(prices) {
+  const posTb = byId("pos_rows");
+  if (!posTb) return;
+
+  for (const tr of posTb.rows) {
+    const price = prices[tr.dataset.asset];
+    const cell = tr.querySelector(".pos-price");
+    if (price !== undefined && cell) cell.textContent = price.toFixed(2);
+  }
+}
+
 /**
  * Render the entire portfolio panel:
  * - Cash
@@ -90,6 +125,7 @@ export function renderPortfolio(p) {
 
   (p.positions || []).forEach((row) => {
     const tr = document.createElement("tr");
+    tr.dataset.asset = row.asset;
     
     // Calculate P&L percentage
     const pnlPct = ((row.price - row.avg) / row.avg) * 100;
@@ -99,7 +135,7 @@ export function renderPortfolio(p) {
       <td><strong>${row.asset}</strong></td>
       <td>${row.qty}</td>
       <td>${row.avg.toFixed(2)}</td>
-      <td>${row.price.toFixed(2)}</td>
+      <td class="pos-price">${row.price.toFixed(2)}</td>
       <td>${row.mktValue.toFixed(2)}</td>
       <td class="${pnlClass}">${formatPnL(row.uPnL)}</td>
       <td class="${pnlClass}">${formatPnL(pnlPct)}%</td>
@@ -13,10 +13,10 @@ import {
 } from "./ui.js";
 
 import { initMarket, updatePrices } from "./market.js";
-import { renderPortfolio } from "./portfolio.js";
+import { renderPortfolio, renderMark, updatePositionPrices } from "./portfolio.js";
 import { renderLeaderboard } from "./leaderboard.js";
 import { initChart, pushTickToHistory } from "./chart.js";
-import { DEFAULTS } from "./constants.js";
+import { ASSETS, DEFAULTS } from "./constants.js";
 
 /* -------------------- State -------------------- */
 
@@ -24,6 +24,7 @@ let ws = null;
 let userId = null;
 let lobbyId = null;
 let isHost = false;
+let tickAssets = ASSETS; // column order of TICK price arrays (sent in GAME_STARTED)
 
 const WS_BASE_URL = window.location.origin.replace(/^http/, "ws") + "/ws";
 
@@ -81,91 +82,107 @@ export function connectWS() {
   };
 
   ws.onmessage = (ev) => {
-    const msg = JSON.parse(ev.data);
-
-    switch (msg.type) {
-      case "HELLO":
-        userId = msg.userId;
-        byId("userIdBox").textContent = `userId: ${userId}`;
-        break;
-
-      case "INVITE_CODE":
-        lobbyId = msg.lobbyId;
-        byId("inviteBox").textContent = `Invite code: ${lobbyId}`;
-        break;
-
-      case "LOBBY_STATE":
-        showLobbyCard(true);
-        lobbyId = msg.lobbyId;
-        byId("lobbyIdTxt").textContent = msg.lobbyId;
-        byId("lobbyStatus").textContent = msg.status;
-        byId("hostIdTxt").textContent = msg.hostId;
-        
-        // Update compact lobby info
-        byId("inviteBox").textContent = msg.lobbyId;
-
-        byId("ruleCap").textContent =
-          msg.rules.startingCapital ?? msg.rules["startingCapital"];
-        byId("ruleTick").textContent =
-          msg.rules.tickSeconds ?? msg.rules["tickSeconds"];
-        byId("ruleDur").textContent =
-          msg.rules.durationSec ?? msg.rules["durationSec"];
-
-        renderPlayers(msg.players);
-
-        isHost = userId === msg.hostId;
-        byId("btnStart").disabled = !(isHost && msg.status === "LOBBY");
-        break;
-
-      case "GAME_STARTED":
-        // Hide all other screens and show only game area
-        showGameArea(true);
-        
-        const lobbyStatus = byId("lobbyStatus");
-        if (lobbyStatus) lobbyStatus.textContent = "RUNNING";
-
-        initChart();
-        initMarket(handleOrder);
-        
-        console.log("✓ Game started - trading interface active");
-        break;
-
-      case "GAME_ENDED":
-        byId("lobbyStatus").textContent = "ENDED";
-        log("Game ended.");
-        break;
-
-      case "TICK":
-        updatePrices(msg.prices);
-        byId("timeLeft").textContent = msg.remainingSec ?? "-";
-        pushTickToHistory(msg.prices);
-        break;
-
-      case "PORTFOLIO":
-        renderPortfolio(msg);
-        break;
-
-      case "LEADERBOARD":
-        renderLeaderboard(msg);
-        break;
-
-      case "ORDER_ACCEPTED":
-        log(
-          `<span class="log-entry success">✓ ORDER ACCEPTED: ${msg.side} ${msg.asset} x${msg.qty} @ ${msg.price}</span>`
-        );
-        break;
-
-      case "ORDER_REJECT":
-        log(`<span class="log-entry error">✗ ORDER REJECTED: ${msg.reason}</span>`);
-        break;
-
-      default:
-        // log("Unknown WS message: " + msg.type);
-        break;
-    }
+    const data = JSON.parse(ev.data);
+
+    // The server batches per-tick messages into one frame as a JSON array.
+    if (Array.isArray(data)) data.forEach(handleMessage);
+    else handleMessage(data);
   };
 }
 
+function handleMessage(msg) {
+  switch (msg.type) {
+    case "HELLO":
+      userId = msg.userId;
+      byId("userIdBox").textContent = `userId: ${userId}`;
+      break;
+
+    case "INVITE_CODE":
+      lobbyId = msg.lobbyId;
+      byId("inviteBox").textContent = `Invite code: ${lobbyId}`;
+      break;
+
+    case "LOBBY_STATE":
+      showLobbyCard(true);
+      lobbyId = msg.lobbyId;
+      byId("lobbyIdTxt").textContent = msg.lobbyId;
+      byId("lobbyStatus").textContent = msg.status;
+      byId("hostIdTxt").textContent = msg.hostId;
+      
+      // Update compact lobby info
+      byId("inviteBox").textContent = msg.lobbyId;
+
+      byId("ruleCap").textContent =
+        msg.rules.startingCapital ?? msg.rules["startingCapital"];
+      byId("ruleTick").textContent =
+        msg.rules.tickSeconds ?? msg.rules["tickSeconds"];
+      byId("ruleDur").textContent =
+        msg.rules.durationSec ?? msg.rules["durationSec"];
+
+      renderPlayers(msg.players);
+
+      isHost = userId === msg.hostId;
+      byId("btnStart").disabled = !(isHost && msg.status === "LOBBY");
+      break;
+
+    case "GAME_STARTED":
+      // Hide all other screens and show only game area
+      showGameArea(true);
+      
+      const lobbyStatus = byId("lobbyStatus");
+      if (lobbyStatus) lobbyStatus.textContent = "RUNNING";
+
+      if (msg.assets) tickAssets = msg.assets;
+
+      initChart();
+      initMarket(handleOrder);
+      
+      console.log("✓ Game started - trading interface active");
+      break;
+
+    case "GAME_ENDED":
+      byId("lobbyStatus").textContent = "ENDED";
+      log("Game ended.");
+      break;
+
+    case "TICK":
+      // Prices arrive as a packed array ordered like `tickAssets`.
+      const prices = {};
+      tickAssets.forEach((asset, i) => { prices[asset] = msg.p[i]; });
+      updatePrices(prices);
+      updatePositionPrices(prices);
+      byId("timeLeft").textContent = msg.remainingSec ?? "-";
+      pushTickToHistory(prices);
+      break;
+
+    case "PORTFOLIO":
+      renderPortfolio(msg);
+      break;
+
+    case "MARK":
+      renderMark(msg);
+      break;
+
+    case "LEADERBOARD":
+      renderLeaderboard(msg);
+      break;
+
+    case "ORDER_ACCEPTED":
+      log(
+        `<span class="log-entry success">✓ ORDER ACCEPTED: ${msg.side} ${msg.asset} x${msg.qty} @ ${msg.price}</span>`
+      );
+      break;
+
+    case "ORDER_REJECT":
+      log(`<span class="log-entry error">✗ ORDER REJECTED: ${msg.reason}</span>`);
+      break;
+
+    default:
+      // log("Unknown WS message: " + msg.type);
+      break;
+  }
+}
+
 export function createLobby() {
   if (!ensureConnected()) {
     log("Not connected (cannot create lobby).");
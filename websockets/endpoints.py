@@ -8,25 +8,237 @@ import asyncio
 import time
 from typing import Optional
 
+import orjson
 from fastapi import WebSocket, WebSocketDisconnect, Query
 
-from config import ASSETS
-from domain.models import LobbyState, PlayerState
+from config import ASSETS, ASSET_INDEX
+from domain.models import LobbyState
 from domain.execution import execute_market
-from domain.portfolio import snapshot_portfolio, leaderboard
-from websockets.utils import send_json_safe, broadcast_lobby, lobby_state_payload
+from domain.portfolio import snapshot_portfolio
+from websockets.utils import send_json_safe, broadcast_lobby_state, writer_loop
 from websockets.ticker import lobby_ticker
 from state import (
     clients,
     user_by_ws,
-    ws_by_user,
+    outbox_by_ws,
+    OUTBOX_MAXSIZE,
     lobbies,
     lobby_by_user,
     gen_user_id,
     gen_lobby_id,
+    acquire_player,
+    release_player,
+    acquire_shared_market,
 )
 
 
+# ---------------------------------------------------------------------------
+# Message handlers: one coroutine per client message type.
+# Each handler receives the client's WebSocket, its userId and the decoded message.
+# ---------------------------------------------------------------------------
+
+# ---------------------- CREATE_LOBBY ----------------------
+async def handle_create_lobby(ws: WebSocket, uid: str, msg: dict):
+  # Determine player name and lobby rules (with defaults)
+  name = msg.get("name") or f"User-{uid[:4]}"
+  rules = msg.get("rules") or {}
+  lobby_id = gen_lobby_id()  # Unique lobby ID
+  lobby = LobbyState(lobby_id, host_id=uid, rules=rules)
+  lobbies[lobby_id] = lobby  # Register lobby globally
+
+  # ensure player object
+  if uid not in lobby.players:
+    lobby.players[uid] = acquire_player(uid, name,
+                                        lobby.rules["startingCapital"])
+  lobby.players[uid].ready = False
+  lobby.players[uid].ws = ws
+  lobby.bump_state()
+  lobby_by_user[uid] = lobby_id  # Remember which lobby this user is in
+
+  # FIX: build invite URL using ws.url.scheme and headers['host']
+  scheme = getattr(ws.url, "scheme", "ws")  # 'ws' or 'wss'
+  http_scheme = "https" if scheme == "wss" else "http"
+  host = ws.headers.get("host", "")
+  invite_url = f"{http_scheme}://{host}/?join={lobby_id}"
+
+  # Send invite info back to the host and broadcast lobby state to all players
+  send_json_safe(ws, {
+      "type": "INVITE_CODE",
+      "lobbyId": lobby_id,
+      "inviteUrl": invite_url,
+  })
+  broadcast_lobby_state(lobby)
+
+
+# ---------------------- JOIN_LOBBY ----------------------
+async def handle_join_lobby(ws: WebSocket, uid: str, msg: dict):
+  lobby_id = (msg.get("lobbyId") or "").upper()  # Normalize ID
+  name = msg.get("name") or f"User-{uid[:4]}"
+  lobby = lobbies.get(lobby_id)
+  if not lobby:
+    # Lobby does not exist
+    send_json_safe(ws, {
+        "type": "ERROR",
+        "code": "lobby_not_found"
+    })
+    return
+  if lobby.status != "LOBBY":
+    # Lobby already running or closed, can't join
+    send_json_safe(ws, {
+        "type": "ERROR",
+        "code": "lobby_not_joinable"
+    })
+    return
+
+  # Ensure player object in this lobby
+  if uid not in lobby.players:
+    lobby.players[uid] = acquire_player(uid, name,
+                                        lobby.rules["startingCapital"])
+  else:
+    lobby.players[uid].name = name
+  lobby.players[uid].ready = False
+  lobby.players[uid].ws = ws
+  lobby.bump_state()
+  lobby_by_user[uid] = lobby_id
+
+  # Broadcast updated lobby state (new player joined)
+  broadcast_lobby_state(lobby)
+
+
+# ---------------------- SET_READY ----------------------
+async def handle_set_ready(ws: WebSocket, uid: str, msg: dict):
+  # Find which lobby this user belongs to
+  lobby_id = lobby_by_user.get(uid)
+  if not lobby_id: return
+  lobby = lobbies.get(lobby_id)
+  if not lobby or lobby.status != "LOBBY": return
+  # Update ready flag
+  ready = bool(msg.get("ready", False))
+  pl = lobby.players.get(uid)
+  if pl:
+    pl.ready = ready
+    lobby.bump_state()
+    # Notify all players of updated ready states
+    broadcast_lobby_state(lobby)
+
+
+# ---------------------- START_GAME ----------------------
+async def handle_start_game(ws: WebSocket, uid: str, msg: dict):
+  lobby_id = lobby_by_user.get(uid)
+  if not lobby_id: return
+  lobby = lobbies.get(lobby_id)
+  if not lobby or lobby.status != "LOBBY": return
+  # Only the host can start the game
+  if uid != lobby.host_id:
+    send_json_safe(ws, {"type": "ERROR", "code": "not_host"})
+    return
+  # require everyone ready
+  if not lobby.players or not all(p.ready
+                                  for p in lobby.players.values()):
+    send_json_safe(ws, {
+        "type": "ERROR",
+        "code": "players_not_ready"
+    })
+    return
+  # Opt-in shared market: attach before RUNNING so orders always see prices;
+  # the lobby ticker detaches it when the game ends
+  if lobby.rules["sharedMarket"] and lobby.shared_market is None:
+    lobby.attach_market(acquire_shared_market(lobby.rules["tickSeconds"]))
+  # Transition lobby to RUNNING state and start ticker task
+  lobby.status = "RUNNING"
+  lobby.bump_state()
+  broadcast_lobby_state(lobby)
+  if not lobby.ticker_task:
+    lobby.ticker_task = asyncio.create_task(lobby_ticker(lobby))
+
+
+# ---------------------- ORDER ----------------------
+async def handle_order(ws: WebSocket, uid: str, msg: dict):
+  lobby_id = lobby_by_user.get(uid)
+  if not lobby_id: return
+  lobby = lobbies.get(lobby_id)
+  if not lobby or lobby.status != "RUNNING": return
+  # Extract order params
+  asset = msg.get("asset")
+  side = msg.get("side")
+  qty = int(msg.get("qty", 0) or 0)
+  # Basic validation of input
+  if asset not in ASSETS or side not in ("BUY", "SELL") or qty <= 0:
+    send_json_safe(ws, {
+        "type": "ORDER_REJECT",
+        "reason": "invalid"
+    })
+    return
+  pl = lobby.players.get(uid)
+  if not pl:
+    send_json_safe(ws, {
+        "type": "ORDER_REJECT",
+        "reason": "player_not_found"
+    })
+    return
+  # Execute market order using domain logic
+  ok, reason = execute_market(lobby, pl, asset, side, qty)
+  if ok:
+    # Acknowledge accepted order and send updated portfolio; the leaderboard
+    # (flagged by execute_market) is coalesced and broadcast by the ticker on
+    # its next tick
+    send_json_safe(
+        ws, {
+            "type": "ORDER_ACCEPTED",
+            "asset": asset,
+            "side": side,
+            "qty": qty,
+            "price": round(float(lobby.prices_arr[ASSET_INDEX[asset]]), 2)
+        })
+    send_json_safe(ws, snapshot_portfolio(lobby, pl))
+  else:
+    # Order rejected with reason
+    send_json_safe(ws, {
+        "type": "ORDER_REJECT",
+        "reason": reason or "unknown"
+    })
+
+
+# ---------------------- LEAVE_LOBBY ----------------------
+async def handle_leave_lobby(ws: WebSocket, uid: str, msg: dict):
+  lobby_id = lobby_by_user.get(uid)
+  if not lobby_id: return
+  lobby = lobbies.get(lobby_id)
+  if not lobby: return
+  # Remove player from lobby and update mapping; recycle the player object
+  pl = lobby.players.pop(uid, None)
+  lobby_by_user.pop(uid, None)
+  if pl:
+    release_player(pl)
+  lobby.bump_state()
+  lobby.leaderboard_dirty = True
+  # Broadcast new lobby state to remaining players
+  broadcast_lobby_state(lobby)
+
+
+# ---------------------- PING / PONG ----------------------
+async def handle_ping(ws: WebSocket, uid: str, msg: dict):
+  # Latency/health check: respond with PONG and current timestamp
+  send_json_safe(ws, {"type": "PONG", "ts": time.time()})
+
+
+async def handle_unknown(ws: WebSocket, uid: str, msg: dict):
+  # ignore unknown
+  pass
+
+
+# Message type -> handler. Dispatch is a single dict lookup per message.
+HANDLERS = {
+    "CREATE_LOBBY": handle_create_lobby,
+    "JOIN_LOBBY": handle_join_lobby,
+    "SET_READY": handle_set_ready,
+    "START_GAME": handle_start_game,
+    "ORDER": handle_order,
+    "LEAVE_LOBBY": handle_leave_lobby,
+    "PING": handle_ping,
+}
+
+
 # Main WebSocket endpoint: one connection per browser/client.
 # Optionally restores a userId if the client reconnects with ?userId=...
 async def ws_endpoint(ws: WebSocket,
@@ -34,186 +246,33 @@ async def ws_endpoint(ws: WebSocket,
   await ws.accept()          # Accept the WebSocket connection (handshake done)
   clients.add(ws)            # Track this WebSocket in the global set of clients
 
+  # Outbound frames go through a bounded queue drained by a dedicated writer
+  # task; everything else only enqueues and never awaits the network.
+  outbox = asyncio.Queue(maxsize=OUTBOX_MAXSIZE)
+  outbox_by_ws[ws] = outbox
+  writer = asyncio.create_task(writer_loop(ws, outbox))
+
   # assign / restore userId
   uid = userId if userId else gen_user_id()  # Reuse provided userId or generate a new one
   user_by_ws[ws] = uid                       # Map WebSocket -> userId
-  ws_by_user[uid] = ws                       # Map userId  -> WebSocket
+
+  # a reconnecting player gets its socket back and needs a full portfolio
+  # snapshot and the leaderboard on the next tick
+  lobby = lobbies.get(lobby_by_user.get(uid, ""))
+  if lobby and uid in lobby.players:
+    lobby.players[uid].ws = ws
+    lobby.players[uid].dirty = True
+    lobby.leaderboard_dirty = True
 
   # greet
-  await send_json_safe(ws, {"type": "HELLO", "userId": uid})  # Initial hello message to client
+  send_json_safe(ws, {"type": "HELLO", "userId": uid})  # Initial hello message to client
 
   try:
     # Main receive loop: handle messages from this client until disconnect/error
     while True:
-      msg = await ws.receive_json()   # Receive JSON message from client
+      msg = orjson.loads(await ws.receive_text())   # Receive JSON message from client
       mtype = msg.get("type")         # Message type (CREATE_LOBBY, ORDER, PING, etc.)
-
-      # ---------------------- CREATE_LOBBY ----------------------
-      if mtype == "CREATE_LOBBY":
-        # Determine player name and lobby rules (with defaults)
-        name = msg.get("name") or f"User-{uid[:4]}"
-        rules = msg.get("rules") or {}
-        lobby_id = gen_lobby_id()  # Unique lobby ID
-        lobby = LobbyState(lobby_id, host_id=uid, rules=rules)
-        lobbies[lobby_id] = lobby  # Register lobby globally
-
-        # ensure player object
-        if uid not in lobby.players:
-          lobby.players[uid] = PlayerState(uid, name,
-                                           lobby.rules["startingCapital"])
-        lobby.players[uid].ready = False
-        lobby_by_user[uid] = lobby_id  # Remember which lobby this user is in
-
-        # FIX: build invite URL using ws.url.scheme and headers['host']
-        scheme = getattr(ws.url, "scheme", "ws")  # 'ws' or 'wss'
-        http_scheme = "https" if scheme == "wss" else "http"
-        host = ws.headers.get("host", "")
-        invite_url = f"{http_scheme}://{host}/?join={lobby_id}"
-
-        # Send invite info back to the host and broadcast lobby state to all players
-        await send_json_safe(ws, {
-            "type": "INVITE_CODE",
-            "lobbyId": lobby_id,
-            "inviteUrl": invite_url,
-        })
-        await broadcast_lobby(lobby, lobby_state_payload(lobby))
-
-      # ---------------------- JOIN_LOBBY ----------------------
-      elif mtype == "JOIN_LOBBY":
-        lobby_id = (msg.get("lobbyId") or "").upper()  # Normalize ID
-        name = msg.get("name") or f"User-{uid[:4]}"
-        lobby = lobbies.get(lobby_id)
-        if not lobby:
-          # Lobby does not exist
-          await send_json_safe(ws, {
-              "type": "ERROR",
-              "code": "lobby_not_found"
-          })
-          continue
-        if lobby.status != "LOBBY":
-          # Lobby already running or closed, can't join
-          await send_json_safe(ws, {
-              "type": "ERROR",
-              "code": "lobby_not_joinable"
-          })
-          continue
-
-        # Ensure player object in this lobby
-        if uid not in lobby.players:
-          lobby.players[uid] = PlayerState(uid, name,
-                                           lobby.rules["startingCapital"])
-        else:
-          lobby.players[uid].name = name
-        lobby.players[uid].ready = False
-        lobby_by_user[uid] = lobby_id
-
-        # Broadcast updated lobby state (new player joined)
-        await broadcast_lobby(lobby, lobby_state_payload(lobby))
-
-      # ---------------------- SET_READY ----------------------
-      elif mtype == "SET_READY":
-        # Find which lobby this user belongs to
-        lobby_id = lobby_by_user.get(uid)
-        if not lobby_id: continue
-        lobby = lobbies.get(lobby_id)
-        if not lobby or lobby.status != "LOBBY": continue
-        # Update ready flag
-        ready = bool(msg.get("ready", False))
-        pl = lobby.players.get(uid)
-        if pl:
-          pl.ready = ready
-          # Notify all players of updated ready states
-          await broadcast_lobby(lobby, lobby_state_payload(lobby))
-
-      # ---------------------- START_GAME ----------------------
-      elif mtype == "START_GAME":
-        lobby_id = lobby_by_user.get(uid)
-        if not lobby_id: continue
-        lobby = lobbies.get(lobby_id)
-        if not lobby or lobby.status != "LOBBY": continue
-        # Only the host can start the game
-        if uid != lobby.host_id:
-          await send_json_safe(ws, {"type": "ERROR", "code": "not_host"})
-          continue
-        # require everyone ready
-        if not lobby.players or not all(p.ready
-                                        for p in lobby.players.values()):
-          await send_json_safe(ws, {
-              "type": "ERROR",
-              "code": "players_not_ready"
-          })
-          continue
-        # Transition lobby to RUNNING state and start ticker task
-        lobby.status = "RUNNING"
-        await broadcast_lobby(lobby, lobby_state_payload(lobby))
-        if not lobby.ticker_task:
-          lobby.ticker_task = asyncio.create_task(lobby_ticker(lobby))
-
-      # ---------------------- ORDER ----------------------
-      elif mtype == "ORDER":
-        lobby_id = lobby_by_user.get(uid)
-        if not lobby_id: continue
-        lobby = lobbies.get(lobby_id)
-        if not lobby or lobby.status != "RUNNING": continue
-        # Extract order params
-        asset = msg.get("asset")
-        side = msg.get("side")
-        qty = int(msg.get("qty", 0) or 0)
-        # Basic validation of input
-        if asset not in ASSETS or side not in ("BUY", "SELL") or qty <= 0:
-          await send_json_safe(ws, {
-              "type": "ORDER_REJECT",
-              "reason": "invalid"
-          })
-          continue
-        pl = lobby.players.get(uid)
-        if not pl:
-          await send_json_safe(ws, {
-              "type": "ORDER_REJECT",
-              "reason": "player_not_found"
-          })
-          continue
-        # Execute market order using domain logic
-        ok, reason = execute_market(lobby, pl, asset, side, qty)
-        if ok:
-          # Acknowledge accepted order and send updated portfolio + leaderboard
-          await send_json_safe(
-              ws, {
-                  "type": "ORDER_ACCEPTED",
-                  "asset": asset,
-                  "side": side,
-                  "qty": qty,
-                  "price": round(lobby.prices[asset], 2)
-              })
-          await send_json_safe(ws, snapshot_portfolio(lobby, pl))
-          await broadcast_lobby(lobby, leaderboard(lobby))
-        else:
-          # Order rejected with reason
-          await send_json_safe(ws, {
-              "type": "ORDER_REJECT",
-              "reason": reason or "unknown"
-          })
-
-      # ---------------------- LEAVE_LOBBY ----------------------
-      elif mtype == "LEAVE_LOBBY":
-        lobby_id = lobby_by_user.get(uid)
-        if not lobby_id: continue
-        lobby = lobbies.get(lobby_id)
-        if not lobby: continue
-        # Remove player from lobby and update mapping
-        lobby.players.pop(uid, None)
-        lobby_by_user.pop(uid, None)
-        # Broadcast new lobby state to remaining players
-        await broadcast_lobby(lobby, lobby_state_payload(lobby))
-
-      # ---------------------- PING / PONG ----------------------
-      elif mtype == "PING":
-        # Latency/health check: respond with PONG and current timestamp
-        await send_json_safe(ws, {"type": "PONG", "ts": time.time()})
-
-      else:
-        # ignore unknown
-        pass
+      await HANDLERS.get(mtype, handle_unknown)(ws, uid, msg)
 
   except WebSocketDisconnect:
     # Client closed the connection gracefully
@@ -224,7 +283,11 @@ async def ws_endpoint(ws: WebSocket,
   finally:
     # cleanup maps
     clients.discard(ws)                   # Remove from global clients set
+    outbox_by_ws.pop(ws, None)            # Stop queueing frames for this socket
+    writer.cancel()                       # Stop its writer task
     uid = user_by_ws.pop(ws, None)        # Remove WebSocket -> userId mapping
-    if uid and ws_by_user.get(uid) is ws:
-      ws_by_user.pop(uid, None)           # Remove userId -> WebSocket mapping if same ws
+    lobby = lobbies.get(lobby_by_user.get(uid, ""))
+    pl = lobby.players.get(uid) if lobby else None
+    if pl and pl.ws is ws:
+      pl.ws = None                        # Player goes offline for broadcasts
     # we keep the player in the lobby for reconnection (by userId)
@@ -1,8 +1,8 @@
 # websockets/ticker.py
 # This module defines the game's real-time "ticker" loop, which:
 # - Advances prices at each tick
-# - Broadcasts price updates to every player
-# - Sends portfolio updates
+# - Sends each player one batched frame per tick: price update,
+#   portfolio update and (when it changed) the leaderboard
 # - Detects game end condition
 # - Runs asynchronously until the game ends
 
@@ -14,12 +14,13 @@ from typing import TYPE_CHECKING
 
 # Used only for type hints; avoids circular imports at runtime
 if TYPE_CHECKING:
-    from domain.models import LobbyState
+    from domain.models import LobbyState, SharedMarket
 
+from config import ASSETS
 from domain.pricing import step_prices                   # Function to update asset prices
-from domain.portfolio import snapshot_portfolio, leaderboard
-from websockets.utils import send_json_safe, broadcast_lobby
-from state import ws_by_user                             # Map: userId -> WebSocket
+from domain.portfolio import snapshot_portfolio, snapshot_mark, is_flat, leaderboard
+from websockets.utils import send_text_safe, broadcast_lobby, batch_frame, dumps
+from state import release_shared_market
 
 
 # Main ticker coroutine for a single lobby.
@@ -28,61 +29,132 @@ async def lobby_ticker(lobby: LobbyState):
   # Tick duration in seconds (how often prices update)
   tick_s = lobby.rules["tickSeconds"]
 
+  # Opt-in shared market (attached by the START_GAME handler): prices come
+  # from the market's own ticker and this loop wakes on its pulse instead of
+  # stepping and sleeping by itself
+  market = lobby.shared_market
+  if market is not None and market.task is None:
+    market.task = asyncio.create_task(shared_market_ticker(market))
+
   # Game start and end timestamps
   lobby.start_ts = time.time()
   lobby.end_ts = lobby.start_ts + lobby.rules["durationSec"]
 
-  # Notify all players that the game has started
-  await broadcast_lobby(lobby, {
+  # Notify all players that the game has started; `assets` fixes the column
+  # order of the packed price array sent in every TICK
+  broadcast_lobby(lobby, {
       "type": "GAME_STARTED",
       "startTs": lobby.start_ts,
-      "endTs": lobby.end_ts
+      "endTs": lobby.end_ts,
+      "assets": ASSETS
   })
 
+  # Tick deadlines run on the loop's monotonic clock so the interval does not
+  # drift by however long each tick's work takes; wall-clock time.time() is
+  # only used for the timestamps sent to clients.
+  loop = asyncio.get_running_loop()
+  next_tick = loop.time()
+
+  # The end of the game is a single scheduled callback rather than a clock
+  # comparison on every tick: it flips the status and the loop below exits.
+  end_handle = loop.call_later(lobby.rules["durationSec"], _end_game, lobby)
+
   try:
-    # Main ticker loop: runs once per tick_s seconds
-    while True:
+    # Main ticker loop: runs once per tick_s seconds until the game ends
+    while lobby.status == "RUNNING":
+      # --------------- Update prices for this tick ---------------
+      if market is None:
+        step_prices(lobby)   # Apply price movement algorithm
+      else:
+        await market.pulse.wait()   # the shared market has stepped prices
+        if market.task.done():
+          _end_game(lobby)          # market ticker died: end instead of waiting forever
+        if lobby.status != "RUNNING":
+          break                     # game ended while waiting
       now = time.time()
 
-      # --------------- Check if game should end ---------------
-      if now >= lobby.end_ts:
-        lobby.status = "ENDED"
-
-        # Notify clients that the game is over
-        await broadcast_lobby(lobby, {
-            "type": "GAME_ENDED",
-            "lobbyId": lobby.lobby_id
-        })
+      # TICK update shared by all players: timestamp in ms ("t"), prices as a
+      # packed array in ASSETS order ("p", no per-asset keys), remaining time
+      tick_json = dumps({
+          "type": "TICK",
+          "t": int(now * 1000),
+          "p": lobby.prices_arr,
+          "remainingSec": int(lobby.end_ts - now)
+      })
+
+      # Full-room leaderboard, but only if it can have changed: orders/roster
+      # changes since the last tick, or open positions being re-marked at the
+      # new prices
+      lb_json = None
+      if lobby.leaderboard_dirty or not all(is_flat(pl) for pl in lobby.players.values()):
+        lb_json = dumps(leaderboard(lobby))
+        lobby.leaderboard_dirty = False
+
+      # --------------- Send one batched frame per player ---------------
+      # Each player gets [TICK, PORTFOLIO|MARK(, LEADERBOARD)] as a single frame.
+      # Players holding positions (or whose portfolio just changed) get a full
+      # snapshot; flat, untouched players only get a compact MARK (the client
+      # refreshes the positions table's prices from the TICK itself).
+      # Frames are only queued: each client's writer task sends them, so a
+      # slow client never delays the tick.
+      for pl in lobby.players.values():
+        ws = pl.ws                  # Player's WebSocket if connected
+        if not ws:
+          continue                  # offline: don't build a snapshot at all
+        if pl.dirty or not is_flat(pl):
+          frames = [tick_json, dumps(snapshot_portfolio(lobby, pl))]
+          pl.dirty = False
+        else:
+          frames = [tick_json, dumps(snapshot_mark(pl))]
+        if lb_json is not None:
+          frames.append(lb_json)
+        send_text_safe(ws, batch_frame(frames))
 
-        # Send final leaderboard
-        await broadcast_lobby(lobby, leaderboard(lobby))
-        break
+      # --------------- Wait until the next tick ---------------
+      # (a shared market lobby waits for the next pulse at the top instead)
+      if market is None:
+        next_tick += tick_s
+        await asyncio.sleep(max(0.0, next_tick - loop.time()))
 
-      # --------------- Update prices for this tick ---------------
-      step_prices(lobby)   # Apply price movement algorithm
-
-      # Broadcast TICK update to all players:
-      # includes timestamps, current prices, and remaining time
-      await broadcast_lobby(
-          lobby, {
-              "type": "TICK",
-              "ts": now,
-              "prices": lobby.prices,
-              "remainingSec": int(lobby.end_ts - now)
-          })
-
-      # --------------- Send individual portfolio snapshots ---------------
-      for uid, pl in lobby.players.items():
-        ws = ws_by_user.get(uid)    # Player's WebSocket if connected
-        if ws:
-          await send_json_safe(ws, snapshot_portfolio(lobby, pl))
-
-      # Also broadcast full-room leaderboard after updating portfolios
-      await broadcast_lobby(lobby, leaderboard(lobby))
+    # --------------- Game over ---------------
+    # Notify clients that the game is over
+    broadcast_lobby(lobby, {
+        "type": "GAME_ENDED",
+        "lobbyId": lobby.lobby_id
+    })
 
-      # --------------- Wait until the next tick ---------------
-      await asyncio.sleep(tick_s)
+    # Send final leaderboard
+    broadcast_lobby(lobby, leaderboard(lobby))
 
   finally:
-    # Ticker has stopped; clear the task handle for cleanup
+    # Ticker has stopped; drop the pending end callback if we exited early
+    # and clear the task handle for cleanup
+    end_handle.cancel()
+    if market is not None:
+      release_shared_market(market)
     lobby.ticker_task = None
+
+
+# Ticker of a shared market: steps prices once per tick for every attached
+# lobby and pulses them. Cancelled when the last lobby detaches; if it dies,
+# the attached lobbies end their games.
+async def shared_market_ticker(market: SharedMarket):
+  loop = asyncio.get_running_loop()
+  next_tick = loop.time()
+  try:
+    while True:
+      step_prices(market)
+      market.pulse.set()      # wake every attached lobby ticker ...
+      market.pulse.clear()    # ... and re-arm for the next tick
+      next_tick += market.tick_seconds
+      await asyncio.sleep(max(0.0, next_tick - loop.time()))
+  finally:
+    # Left set on purpose: if stepping raised, the attached lobby tickers wake,
+    # see the task is done and end their games rather than wait forever
+    market.pulse.set()
+
+
+def _end_game(lobby: LobbyState):
+  # Scheduled via loop.call_later at game start; ends the ticker loop.
+  lobby.status = "ENDED"
+  lobby.bump_state()
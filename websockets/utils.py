@@ -2,36 +2,130 @@
 
 from __future__ import annotations   # Allows forward references in type hints (avoids circular imports)
 
+import asyncio
 from typing import TYPE_CHECKING
+
+import orjson
 from fastapi import WebSocket
 
 # Imported only during type checking to avoid runtime circular dependencies
 if TYPE_CHECKING:
     from domain.models import LobbyState
 
-from state import ws_by_user   # Global mapping: user_id -> WebSocket connection
+from state import outbox_by_ws   # WebSocket -> outbound frame queue
+
+# NumPy arrays/scalars (prices, quantities) are encoded natively, without a
+# .tolist()/float() conversion first.
+_ORJSON_OPTS = orjson.OPT_SERIALIZE_NUMPY
+
+
+def dumps(payload) -> str:
+  """
+  Serialize a payload to a JSON text frame with orjson.
+  """
+  return orjson.dumps(payload, option=_ORJSON_OPTS).decode()
+
+
+async def writer_loop(ws: WebSocket, outbox: asyncio.Queue):
+  """
+  Per-connection writer task: drain the connection's outbox to the socket.
+  This is the only coroutine that writes to `ws`, so a slow client only
+  backs up its own queue. Stops on the first send error (disconnect).
+  """
+  while True:
+    data = await outbox.get()
+    try:
+      await ws.send_text(data)
+    except Exception:
+      break                        # Client gone; the endpoint cleans up the maps
+
+
+def send_text_safe(ws: WebSocket, data: str):
+  """
+  Queue an already-serialized JSON text frame for a WebSocket client.
+  Never blocks: if the client's outbox is full, its oldest pending frame is
+  dropped. Sockets without an outbox (already disconnected) are ignored.
+  """
+  outbox = outbox_by_ws.get(ws)
+  if outbox is None:
+    return
+  if outbox.full():
+    outbox.get_nowait()            # Backpressure: drop the oldest frame
+  outbox.put_nowait(data)
+
+
+def send_json_safe(ws: WebSocket, payload: dict):
+  """
+  Queue a JSON payload (encoded with orjson) for a WebSocket client.
+  If the client disconnected, silently ignore it.
+  """
+  send_text_safe(ws, dumps(payload))
+
+
+def batch_frame(frames: list) -> str:
+  """
+  Join already-serialized JSON messages into a single JSON array frame, so
+  several messages reach a client in one WebSocket frame (the client
+  dispatches each element of a top-level array as its own message).
+  """
+  return "[" + ",".join(frames) + "]"
+
+
+def lobby_sockets(lobby: LobbyState) -> list:
+  """
+  Return the WebSockets of the lobby's currently connected players.
+  Players without a live connection (`pl.ws is None`) are skipped.
+  """
+  # Iterates the players dict directly (no snapshot copy): broadcasts are
+  # synchronous, so nothing can join or leave the lobby mid-loop.
+  return [pl.ws for pl in lobby.players.values() if pl.ws is not None]
+
+
+def broadcast_raw(lobby: LobbyState, data: str):
+  """
+  Queue an already-serialized JSON text frame for every connected player in the lobby.
+  """
+  sockets = lobby_sockets(lobby)
+  if not sockets:
+    return
+  for ws in sockets:
+    send_text_safe(ws, data)
+
+
+def broadcast_lobby(lobby: LobbyState, payload: dict): #broadcasting = sending the same message to many users at once 
+  """
+  Queue the same payload for every connected player in the lobby.
+  The payload is serialized once (orjson) and the same frame is reused for
+  every recipient; if nobody is connected it is not serialized at all.
+  Each client's writer task does the actual sending, so this never waits
+  on a slow client.
+  """
+  sockets = lobby_sockets(lobby)
+  if not sockets:
+    return
+  data = dumps(payload)
+  for ws in sockets:
+    send_text_safe(ws, data)
 
 
-async def send_json_safe(ws: WebSocket, payload: dict):
+def lobby_state_json(lobby: LobbyState) -> str:
   """
-  Safely send a JSON payload to a WebSocket client.
-  If the client disconnected or an error occurs, silently ignore it.
+  Return the serialized LOBBY_STATE frame for the lobby.
+  The frame is encoded once per `lobby.state_version` and reused by every
+  broadcast until the next `lobby.bump_state()`.
   """
-  try:
-    await ws.send_json(payload)   # Send JSON message to this WebSocket
-  except Exception:
-    pass                           # Avoid crashing due to disconnects
+  cache = lobby._state_cache
+  if cache is None or cache[0] != lobby.state_version:
+    cache = (lobby.state_version, dumps(lobby_state_payload(lobby)))
+    lobby._state_cache = cache
+  return cache[1]
 
 
-async def broadcast_lobby(lobby: LobbyState, payload: dict): #broadcasting = sending the same message to many users at once 
+def broadcast_lobby_state(lobby: LobbyState):
   """
-  Send the same payload to every connected player in the lobby.
-  Iterates through all players and looks up their WebSocket in ws_by_user.
+  Broadcast the (cached) LOBBY_STATE frame to every connected player in the lobby.
   """
-  for uid, pl in list(lobby.players.items()):   # Loop over players in lobby
-    ws = ws_by_user.get(uid)                    # WebSocket for this user, if connected
-    if ws:
-      await send_json_safe(ws, payload)         # Send payload safely
+  broadcast_raw(lobby, lobby_state_json(lobby))
 
 
 def lobby_state_payload(lobby: LobbyState):